@@ -65,7 +65,24 @@ around 80 percent of cases...
 
 """
 import math
-import random
+import os
+from multiprocessing import Pool
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # without numba, step() below runs as plain (slow) python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+try:
+    import torch
+except ImportError:
+    # only needed to run on a GPU
+    torch = None
 
 population = 30054 # for local town of schools
 historic_cases = 536 # gives idea on population immunity
@@ -75,6 +92,9 @@ actual_cases_last_month = cases_last_month*(undetected_per_detected+1)
 actual_historic_cases = historic_cases*(undetected_per_detected+1)
 
 test_lag = 1 # days to get test results
+# earliest_positive_test_day of a classroom with no positive 
+# test yet ("never"), so the earliest day is a running minimum
+no_positive_test = np.iinfo(np.int32).max
 first_contagious_day = 3
 last_contagious_day = 13
 
@@ -97,192 +117,264 @@ class_spread_rate = .3 # daily chance of spread between 2 students
 N_sim = 1000
 N_days = 90
 
-class person:
-    def __init__(self, name, age):
-        self.name = name
-        self.age = age
-        self.days_with_virus = -1
-        self.day_infected = 1000000
-        self.family_unit = None
-        self.preexisting_immunity = False
-        #self.would_show_symptoms = would_show_symptoms
-        
-    def give_preexisting_immunity(self):
-        self.preexisting_immunity = True
-        
-    def assign_to_family(self, fam):
-        self.family_unit = fam
-
-    def is_sick(self):
-        if self.days_with_virus > -1:
-            return True
-        else:
-            return False
-        
-    def tests_positive(self):
-        #According to
-        #https://files.constantcontact.com/340b0174501/3f8891bd-72ab-4784-8f79-95d1314ead01.pdf 
-        #There is high RNA generally within 1-2 days 
-        #after the initial infection.
-        if ((self.days_with_virus > first_positive_test_day) and
-            (self.days_with_virus <= last_positive_test_day)):
-            return True
-        else:
-            return False
-
-    def is_contagious(self):
-        if ((self.days_with_virus >= first_contagious_day) and
-            (self.days_with_virus < last_contagious_day)):
-            return True
-        else:
-            return False
-            
-    def sicken(self, day):
-        if (self.days_with_virus == -1) and\
-            (not self.preexisting_immunity):
-            self.days_with_virus = 0
-            self.day_infected = day
-            
-    def update_days_sick(self):
-        if self.days_with_virus != -1:
-            self.days_with_virus += 1
-        
-
-class classroom:
-    def __init__(self, number, class_size, age, num_teachers):
-        self.number = number # id for classroom
-        self.students = [
-                person("student_" + str(number) + "_" + str(i),
-                       age)
-                for i in range(class_size)]
-        self.teachers = [
-                person("teacher_" + str(number) + "_" + str(i),
-                       30)
-                for i in range(num_teachers)]
-
-        self.earliest_positive_test_day = None
-        
-
-    def assign_to_families(self, fam_assignments):
-        for stdt in self.students:
-            fam = fam_assignments.pop(0)
-            stdt.assign_to_family(fam)
-
-    def any_contagious_cases_in_classroom(self):
-        any_cases = False
-        for stdt in self.students:
-            if stdt.is_contagious():
-                any_cases = True
-        for teach in self.teachers:
-            if teach.is_contagious():
-                any_cases = True
-        return any_cases
-
-    def num_contagious_students_in_classroom(self):
-        num_contagious = 0
-        for stdt in self.students:
-            if stdt.is_contagious():
-                num_contagious += 1
-        return num_contagious
-
-    def sicken_all(self, day):
-        # sickens everyone who doesn't have virus already
-        for stdt in self.students:
-            stdt.sicken(day)
-        for teach in self.teachers:
-            teach.sicken(day)
-
-    def class_spread(self, day):
-        # sicken others in class probabilistically
-        # class_spread_rate is chance a single contagious
-        # student or teacher will transmit to a single
-        # other student or teacher who is currently healthy
-
-        num_contagious = self.num_contagious_students_in_classroom()
-        for teach in self.teachers:
-            if teach.is_contagious():
-                num_contagious += 1
-
-        # say 2 contagious people, and 40% class spread rate
-        # prob not transmitting is (1-0.4)^2 = 0.36
-        # so prob transmitting is 1 - (1-0.4)^2 = 0.64
-        prob_transmission = 1-(1-class_spread_rate)**num_contagious
-        for stdt in self.students:
-            if random.uniform(0, 1) < prob_transmission:
-                stdt.sicken(day)
-        for teach in self.teachers:
-            if random.uniform(0, 1) < prob_transmission:
-                teach.sicken(day)
-
-    def update_days_sick(self):
-        for stdt in self.students:
-            stdt.update_days_sick()
-        for teach in self.teachers:
-            teach.update_days_sick()
-
-    def test(self, day):
-        for stdt in self.students:
-            if stdt.tests_positive():
-                if self.earliest_positive_test_day is None:
-                    self.earliest_positive_test_day = day
-        for teach in self.teachers:
-            if teach.tests_positive():
-                if self.earliest_positive_test_day is None:
-                    self.earliest_positive_test_day = day
-
-    def test_imperfect(self, day):
+batch_size = 256 # max sims run side by side in one process
+use_gpu = True # run all sims as one batch on a CUDA GPU, if torch has one
+
+def is_contagious(days_with_virus):
+    # boolean mask of who is contagious, given days_with_virus
+    return ((days_with_virus >= first_contagious_day) &
+            (days_with_virus < last_contagious_day))
+
+def tests_positive(days_with_virus):
+    #According to
+    #https://files.constantcontact.com/340b0174501/3f8891bd-72ab-4784-8f79-95d1314ead01.pdf 
+    #There is high RNA generally within 1-2 days 
+    #after the initial infection.
+    return ((days_with_virus > first_positive_test_day) &
+            (days_with_virus <= last_positive_test_day))
+
+@njit(cache=True)
+def step(days_with_virus, day_infected, family_id, classroom_id,
+         is_student, preexisting_immunity, active, num_active,
+         earliest_positive_test_day,
+         num_contagious, num_positive, contagious_families,
+         day, weekday, test_day, uniforms, settled):
+    # One day in one school, for every sim in the batch
+    # (see school.step).
+    # Written as explicit loops so numba compiles it, with
+    # one pass over the active people (see SchoolArrays) to
+    # bring days_with_virus up to today and count who is
+    # contagious / would test positive, and, only if someone
+    # can catch the virus today, one pass to spread it.
+    num_sims, num_people = days_with_virus.shape
+    num_classrooms = len(num_contagious)
+
+    for b in range(num_sims):
+        # (a settled sim's results can't change any more,
+        # see sims_settled)
+        if settled[b]:
+            continue
+        num_contagious[:] = 0
+        num_positive[:] = 0
+        contagious_families[:] = False
+        any_contagious = False
+        still_active = 0
+        for k in range(num_active[b]):
+            i = active[b, k]
+            # For sick people, increments days_with_virus
+            # (except new cases from outside the town today,
+            # who start at 0)
+            d = days_with_virus[b, i]
+            if day_infected[b, i] < day:
+                d += 1
+                days_with_virus[b, i] = d
+
+            # once past contagious and testing positive,
+            # nothing about them changes anything, so they 
+            # drop out of the active list
+            if (d < last_contagious_day) or (d <= last_positive_test_day):
+                active[b, still_active] = i
+                still_active += 1
+
+            # who is contagious / would test positive today
+            if (d >= first_contagious_day) and (d < last_contagious_day):
+                any_contagious = True
+                num_contagious[classroom_id[i]] += 1
+                # (only students spread within families)
+                if is_student[i]:
+                    contagious_families[family_id[b, i]] = True
+            if ((d > first_positive_test_day) and
+                (d <= last_positive_test_day)):
+                num_positive[classroom_id[i]] += 1
+        num_active[b] = still_active
+
+        # spread virus within classrooms, only on weekdays
+        # and only if classroom is not offline
+        # (i.e., has positive test results),
+        # and within families every day
+        # TODO - spread between classrooms (e.g., bathrooms, busses)
+        # (only if someone is contagious today)
+        if any_contagious:
+            for i in range(num_people):
+                if ((days_with_virus[b, i] != -1) or
+                    preexisting_immunity[b, i]):
+                    continue
+                c = classroom_id[i]
+                sicken = (is_student[i] and
+                          contagious_families[family_id[b, i]])
+                if (weekday and num_contagious[c] > 0 and
+                    not (day - test_lag > earliest_positive_test_day[b, c])):
+                    # class_spread_rate is chance a single contagious
+                    # student or teacher will transmit to a single
+                    # other student or teacher who is currently healthy
+                    # say 2 contagious people, and 40% class spread rate
+                    # prob not transmitting is (1-0.4)^2 = 0.36
+                    # so prob transmitting is 1 - (1-0.4)^2 = 0.64
+                    prob_transmission = (
+                            1-(1-class_spread_rate)**num_contagious[c])
+                    if uniforms[b, i] < prob_transmission:
+                        sicken = True
+                if sicken:
+                    days_with_virus[b, i] = 0
+                    day_infected[b, i] = day
+                    active[b, num_active[b]] = i
+                    num_active[b] += 1
+
+        # test for virus
         # Assumes test does not catch cases every time
-        could_be_positive = False
-        for stdt in self.students:
-            if stdt.tests_positive():
-                could_be_positive = True
-        for teach in self.teachers:
-            if teach.tests_positive():
-                could_be_positive = True
-
-        if could_be_positive:
-           if random.uniform(0, 1) < sensitivity:
-                if self.earliest_positive_test_day is None:
-                    self.earliest_positive_test_day = day
-                
-    def offline(self, day):
-        # classroom taken offline when there is positive test
-        if self.earliest_positive_test_day is None:
-            return False
-        elif day > self.earliest_positive_test_day + test_lag:
-            return True
-        else:
-            return False
+        if test_day:
+            for c in range(num_classrooms):
+                if (num_positive[c] > 0 and
+                    uniforms[b, num_people + c] < sensitivity):
+                    earliest_positive_test_day[b, c] = min(
+                        earliest_positive_test_day[b, c], day)
+
+
+@dataclass
+class SchoolArrays:
+    # Everyone in a school, stored as parallel arrays 
+    # (one entry per person) instead of person objects.
+    # People are laid out classroom by classroom, students
+    # first and then teachers, so the xth person in the
+    # school is simply index x.
+    # Arrays that differ between sims have one row per sim
+    # in the batch, i.e. shape (num_sims, num_people).
+    days_with_virus: np.ndarray # int16, -1 if never sick
+    day_infected: np.ndarray # int32, 1000000 if never sick
+    family_id: np.ndarray # int32, -1 for teachers (no family)
+    classroom_id: np.ndarray # int16, 0-based, same for all sims
+    is_student: np.ndarray # bool, False for teachers, same for all sims
+    preexisting_immunity: np.ndarray # bool
+    # people who have the virus and are still contagious or
+    # would still test positive, as indices: the first
+    # num_active[b] entries of active[b] for sim b
+    active: np.ndarray # int32
+    num_active: np.ndarray # int32, shape (num_sims,)
+    age: np.ndarray # int8, same for all sims
+
+
+@dataclass(frozen=True)
+class SchoolLayout:
+    # The parts of a school that are the same in every sim
+    # (who is in which classroom, students vs teachers, names),
+    # built once per school by build_school_layout and shared
+    # by every batch; never written to
+    num_classrooms: int
+    class_size: int
+    class_start: np.ndarray # intp, first person of each classroom
+    classroom_id: np.ndarray # int16, 0-based
+    is_student: np.ndarray # bool, False for teachers
+    age: np.ndarray # int8
+    names: list # names are only used to look people up by name
+    num_families: int # families the students are spread over
+
+
+def build_school_layout(num_classrooms, class_size, ages_list,
+                        teachers_per_class):
+    # ages_list has one age for each classroom 
+    # all students in a classroom assumed to be same age
+    people_per_class = class_size + teachers_per_class
+    total = num_classrooms*people_per_class
+    is_student = np.tile(
+            np.arange(people_per_class) < class_size, num_classrooms)
+
+    # (classrooms are numbered from 1 in names)
+    names = []
+    for c in range(num_classrooms):
+        names += ["student_" + str(c+1) + "_" + str(i)
+                  for i in range(class_size)]
+        names += ["teacher_" + str(c+1) + "_" + str(i)
+                  for i in range(teachers_per_class)]
+
+    return SchoolLayout(
+            num_classrooms=num_classrooms,
+            class_size=class_size,
+            class_start=np.arange(
+                0, total, people_per_class, dtype=np.intp),
+            classroom_id=np.repeat(
+                np.arange(num_classrooms, dtype=np.int16),
+                people_per_class),
+            is_student=is_student,
+            age=np.where(is_student,
+                         np.repeat(ages_list[:num_classrooms],
+                                   people_per_class),
+                         30).astype(np.int8),
+            names=names,
+            num_families=math.floor(
+                num_classrooms*class_size/students_per_family))
+
 
 class school: 
-    def __init__(self, name, num_classrooms,
-                 class_size, ages_list, teachers_per_class):
-        # ages_list has one age for each classroom 
-        # all students in a classroom assumed to be same age
+    def __init__(self, name, layout, num_sims, rng):
+        # holds num_sims independent copies of the school
+        # with the given layout (a SchoolLayout), 
+        # rng is the numpy random Generator for the batch
         
         self.name = name # name of school
-        
-        self.classrooms = [
-                classroom(i+1, class_size, ages_list[i],
-                          teachers_per_class)
-                for i in range(num_classrooms)
-                ]
-        
-        self.class_size = class_size
-        
-    def test(self, day):
-        for clrm in self.classrooms:
-            #clrm.test(day)
-            clrm.test_imperfect(day)
-                    
-    def actual_students_per_family(self):
-        family_set = set()
-        num_students = 0
-        for clrm in self.classrooms:
-            for stdt in clrm.students:
-                family_set.add(stdt.family_unit)
-                num_students += 1
-        return num_students/len(family_set)
+        self.num_sims = num_sims
+        self.rng = rng
+        self.layout = layout
+        self.num_classrooms = num_classrooms = layout.num_classrooms
+        self.class_size = layout.class_size
+
+        # only the arrays that differ between sims are 
+        # allocated here, the rest are shared with the layout
+        total = len(layout.classroom_id)
+        self.arrays = SchoolArrays(
+                days_with_virus=np.full(
+                    (num_sims, total), -1, dtype=np.int16),
+                day_infected=np.full(
+                    (num_sims, total), 1000000, dtype=np.int32),
+                family_id=np.full((num_sims, total), -1, dtype=np.int32),
+                classroom_id=layout.classroom_id,
+                is_student=layout.is_student,
+                preexisting_immunity=np.zeros(
+                    (num_sims, total), dtype=bool),
+                active=np.zeros((num_sims, total), dtype=np.int32),
+                num_active=np.zeros(num_sims, dtype=np.int32),
+                age=layout.age)
+
+        self.class_start = layout.class_start
+        self.names = layout.names
+
+        # no_positive_test until a classroom has a positive test
+        self.earliest_positive_test_day = np.full(
+                (num_sims, num_classrooms), no_positive_test,
+                dtype=np.int32)
+        self.num_families = 0
+
+        # indices of people who never get preexisting immunity
+        # or new cases from outside the town (see protect)
+        self.protected = set()
+
+        # scratch space for step(), reused every day:
+        # counts per classroom, a flag per family (there are
+        # never more families than people), and for each sim one 
+        # random draw per person followed by one per classroom 
+        # (for the test), in single precision since a
+        # uniform only ever gets compared against a probability
+        self.num_contagious = np.zeros(num_classrooms, dtype=np.int32)
+        self.num_positive = np.zeros(num_classrooms, dtype=np.int32)
+        self.contagious_families = np.zeros(total, dtype=bool)
+        self.uniforms = np.empty(
+                (num_sims, total + num_classrooms), dtype=np.float32)
+
+    def step(self, day, weekday, test_day, settled):
+        # advances days_with_virus to today, spreads virus 
+        # and tests (if test_day), all in one compiled call
+        arr = self.arrays
+        self.rng.random(out=self.uniforms, dtype=np.float32)
+        step(arr.days_with_virus, arr.day_infected, arr.family_id,
+             arr.classroom_id, arr.is_student, arr.preexisting_immunity,
+             arr.active, arr.num_active, self.earliest_positive_test_day,
+             self.num_contagious, self.num_positive, self.contagious_families,
+             day, weekday, test_day, self.uniforms, settled)
+
+    def actual_students_per_family(self, b):
+        # for sim b
+        arr = self.arrays
+        family_ids = arr.family_id[b, arr.is_student]
+        return len(family_ids)/len(np.unique(family_ids))
 
     def assign_to_random_families(self):
         
@@ -290,177 +382,159 @@ class school:
             print ("Can't have fewer than 1 student per family.")
             return
        
-        num_families = math.floor(
-                self.total_students()/students_per_family)
-        fam_assignments = list(range(num_families))
-        
-        for i in range(self.total_students() - num_families):
-            fam_assignments.append(random.randint(0, num_families-1))
+        num_students = self.total_students()
+        num_families = self.layout.num_families
+
+        # every family gets one student, the rest go to random
+        # families, then each sim's students are shuffled
+        fam_assignments = np.empty(
+                (self.num_sims, num_students), dtype=np.int32)
+        fam_assignments[:, :num_families] = np.arange(num_families)
+        fam_assignments[:, num_families:] = self.rng.integers(
+                0, num_families, size=(self.num_sims,
+                                       num_students - num_families))
         
-        random.shuffle(fam_assignments)
-        for clrm in self.classrooms:
-            clrm.assign_to_families(fam_assignments[0:self.class_size])
-            del fam_assignments[0:self.class_size]
-
-    def spread_virus(self, day):
-        # spread virus 
-
-        #within classrooms, only on weekdays
-        #and only if classroom is not offline 
-        #(i.e., has positive test results)
-        if not ((day % 7) in [5, 6]):
-            for clrm in self.classrooms:
-                if (not clrm.offline(day)):
-                    if clrm.any_contagious_cases_in_classroom():
-                        #clrm.sicken_all(day)
-                        clrm.class_spread(day)
-        # TODO - spread between classrooms (e.g., bathrooms, busses)
-        
-        #within families
-        contagious_families = set()
-        for clrm in self.classrooms:
-            for stdt in clrm.students:
-                if stdt.is_contagious():
-                    contagious_families.add(stdt.family_unit)
-
-        for clrm in self.classrooms:
-            for stdt in clrm.students:
-                if stdt.family_unit in contagious_families:
-                    stdt.sicken(day)
-                    
+        self.arrays.family_id[:, self.arrays.is_student] =\
+            self.rng.permuted(fam_assignments, axis=1)
+        self.num_families = num_families
+
+    def assign_to_own_family(self, x):
+        # puts xth person in a new family of their own
+        # (in every sim)
+        self.arrays.family_id[:, x] = self.num_families
+        self.num_families += 1
+
+    def sicken(self, mask, day):
+        # sickens everyone in mask who doesn't have virus
+        # already and has no preexisting immunity
+        # (mask has one row per sim, or is shared by all sims)
+        arr = self.arrays
+        mask = (mask & (arr.days_with_virus == -1) &
+                ~arr.preexisting_immunity)
+        arr.days_with_virus[mask] = 0
+        arr.day_infected[mask] = day
+        for b, x in zip(*np.nonzero(mask)):
+            self.add_active(b, x)
+
+    def add_active(self, b, x):
+        # adds xth person to sim b's active list (just sickened)
+        arr = self.arrays
+        arr.active[b, arr.num_active[b]] = x
+        arr.num_active[b] += 1
+
+    def sicken_all(self, c, day):
+        # sickens everyone in classroom c 
+        # who doesn't have virus already (in every sim)
+        self.sicken(self.arrays.classroom_id == c, day)
+
     def total_people(self):
         # returns total people in the school
         # includes teachers and students only (no admins)
-        total = 0
-        for clrm in self.classrooms:
-            total += len(clrm.students) + len(clrm.teachers)
-        return total
+        return len(self.arrays.classroom_id)
 
     def total_students(self):
         # returns total students in the school
-        total = 0
-        for clrm in self.classrooms:
-            total += len(clrm.students)
-        return total
+        return np.count_nonzero(self.arrays.is_student)
 
     def total_students_contagious(self):
-        # returns total students contagious in school
+        # returns total students contagious in school, per sim
         # (We assume only students spread the virus to other
         # classrooms, via busses and siblings)
-        total = 0
-        for clrm in self.classrooms:
-            total += clrm.num_contagious_students_in_classroom()
-        return total
-
-    def update_days_sick(self):
-        # For sick people, increments days_with_virus
-        for clrm in self.classrooms:
-            clrm.update_days_sick()
+        arr = self.arrays
+        return np.count_nonzero(
+                is_contagious(arr.days_with_virus) & arr.is_student,
+                axis=1)
 
     def any_school_cases(self):
-        # Returns true if any cases in the school
-        any_cases = False
-        for clrm in self.classrooms:
-            for stdt in clrm.students:
-                if stdt.is_sick():
-                    any_cases = True
-                
-            for teach in clrm.teachers:
-                if teach.is_sick():
-                    any_cases = True
-                    
-        return any_cases
+        # Returns true if any cases in the school, per sim
+        return (self.arrays.days_with_virus > -1).any(axis=1)
 
     def any_contagious_cases_in_classroom(self, classrm):
-        # Returns true if any cases in classrm
-        any_cases = False
-        for clrm in self.classrooms:
-            if clrm.number == classrm:
-                any_cases = clrm.any_contagious_cases_in_classroom()
-        return any_cases
-
-    def preexisting_immunity_to_xth_person(self, x, exclude_list):
-        # gives xth person preexisting immunity
-        # if not in exclude_list
-        p = -1
-        for clrm in self.classrooms:
-            for stdt in clrm.students:
-                p += 1
-                if p == x:
-                    if stdt.name in exclude_list:
-                        return
-                    else: 
-                        stdt.give_preexisting_immunity()
-                        return
-
-            for teach in clrm.teachers:
-                p += 1
-                if p == x:
-                    if teach.name in exclude_list:
-                        return
-                    else: 
-                        teach.give_preexisting_immunity()
-                        return
-
-
-        print ("Error - there are not {} applicable people in school".format(x))
-
-
-    def sicken_xth_person(self, x, exclude_list, day):
-        # makes xth person sick and returns True if 
-        # not excluded and not already sick
-        # (we don't sicken anyone on exclude_list)
+        # Returns true if any cases in classrm, per sim
+        # (classrm is numbered from 1)
+        # classrooms are contiguous, so this only looks at a 
+        # slice of the classroom's own people
+        start = self.class_start[classrm-1]
+        if classrm < self.num_classrooms:
+            stop = self.class_start[classrm]
+        else:
+            stop = self.total_people()
+        return is_contagious(
+                self.arrays.days_with_virus[:, start:stop]).any(axis=1)
+
+    def protect(self, names):
+        # adds the people with these names to self.protected
+        for name in names:
+            self.protected.add(self.names.index(name))
+
+    def give_preexisting_immunity(self, immune):
+        # gives preexisting immunity to everyone in immune
+        # (one row per sim) if not protected
+        arr = self.arrays
+        arr.preexisting_immunity[:] = immune
+        arr.preexisting_immunity[:, list(self.protected)] = False
+
+    def sicken_xth_person(self, b, x, day):
+        # makes xth person sick in sim b and returns True if 
+        # not protected and not already sick
+        # (we don't sicken anyone protected)
         # first person in school is person 0
         # else returns False
-        p = -1
-        for clrm in self.classrooms:
-            for stdt in clrm.students:
-                p += 1
-                if p == x:
-                    if stdt.name in exclude_list:
-                        return False
-                    if stdt.is_sick():
-                        return False
-                    else:
-                        stdt.sicken(day)
-                        return True
-                
-            for teach in clrm.teachers:
-                p += 1
-                if p == x:
-                    if teach.name in exclude_list:
-                        return False
-                    if teach.is_sick():
-                        return False
-                    else:
-                        teach.sicken(day)
-                        return True
-
-        print ("Error - there are not {} applicable people in school".format(x))
+        if x >= self.total_people():
+            print ("Error - there are not {} applicable people in school".format(x))
+            return
+        arr = self.arrays
+        if x in self.protected:
+            return False
+        if arr.days_with_virus[b, x] > -1:
+            return False
+        else:
+            if not arr.preexisting_immunity[b, x]:
+                arr.days_with_virus[b, x] = 0
+                arr.day_infected[b, x] = day
+                self.add_active(b, x)
+            return True
     
 
-def resident_cases(residents):
-    num_cases = 0
-    for i in residents:
-        if i.is_sick():
-            num_cases += 1
-    return num_cases
-
+def sample_non_immune(immune, k, rng):
+    # picks k[b] different non-immune people at random in each 
+    # sim b (like random.sample on a list of the non-immune)
+    # without building that list: picks from everyone, then 
+    # redraws picks that are immune and sims that picked 
+    # someone twice, so the work is O(k) rather than O(population)
+    # returns the sim and the person of every pick
+    num_sims, num_people = immune.shape
+    max_k = k.max()
+    sims = np.arange(num_sims)[:, None]
+    integers = rng.integers # (looked up once, not once per redraw)
+    picks = integers(0, num_people, size=(num_sims, max_k))
+    while True:
+        redraw = immune[sims, picks]
+        sorted_picks = np.sort(picks, axis=1)
+        redraw[(sorted_picks[:, 1:] == sorted_picks[:, :-1]
+                ).any(axis=1)] = True
+        num_redraws = np.count_nonzero(redraw)
+        if num_redraws == 0:
+            break
+        picks[redraw] = integers(0, num_people, size=num_redraws)
+    rows, cols = np.nonzero(np.arange(max_k) < k[:, None])
+    return rows, picks[rows, cols]
 
 # In what pct of simulations does S1 or S2 get virus?
 new_cases_per_day = actual_cases_last_month/30
 fraction_part = new_cases_per_day % 1
 
-S1_infections = 0
-S2_infections = 0
-S1_infections_no_warning = 0
-S1_infections_some_warning = 0 # in time to save 2nd degree of separation
-S1_infections_good_warning = 0 # in time to save 1st degree of separation
+# school layouts, the same in every sim and batch
+S1_layout = build_school_layout(S1_classes_in_school, S1_class_size,
+                                [5]*S1_class_size, S1_teachers)
+S2_layout = build_school_layout(S2_classes_in_school, S2_class_size,
+                                [3]*S2_class_size, S2_teachers)
 
-Agg_infections = 0
-Agg_infections_no_warning = 0
-Agg_infections_some_warning = 0
-Agg_infections_good_warning = 0
+# every simulated day, and which of them are weekdays 
+# (classes meet) and test days
+num_sim_days = N_days+2*first_contagious_day
+is_weekday = np.arange(num_sim_days) % 7 < 5
+is_test_day = np.isin(np.arange(num_sim_days) % 7, [0, 2])
 
 def determine_agg_warnings(
     earliest_positive_test_day,
@@ -469,15 +543,16 @@ def determine_agg_warnings(
     Agg_infections_some_warning,
     Agg_infections_good_warning
     ):
-    if earliest_positive_test_day is None:
-        Agg_infections_no_warning += 1
-                  
-    elif earliest_positive_test_day\
-        + test_lag >= day_contagious + first_contagious_day:
+    # (S1's own warnings follow the same rule, so run_batch
+    # uses this for them too)
+    # compares the test day against thresholds moved over by 
+    # test_lag (rather than adding test_lag to the test day), 
+    # so no_positive_test never overflows and needs no branch
+    if (earliest_positive_test_day >=
+        day_contagious + first_contagious_day - test_lag):
         Agg_infections_no_warning += 1
             
-    elif earliest_positive_test_day\
-        + test_lag >= day_contagious:
+    elif earliest_positive_test_day >= day_contagious - test_lag:
         Agg_infections_some_warning += 1
 
     else: 
@@ -488,40 +563,297 @@ def determine_agg_warnings(
             Agg_infections_good_warning)
 
 
-for sim in range(N_sim):
-    print ("Sim: {}".format(sim))
+def run_days(S1_school, S2_school, immune, daily_cases, rng):
+    # Runs every day of a batch of sims, updating the
+    # schools in place
+    num_residents = (population - S1_school.total_people()
+                     - S2_school.total_people())
+
+    # everyone is numbered residents first, then S1, then S2,
+    # so offsets[g] is the number of the first person in group g
+    schools = [None, S1_school, S2_school]
+    offsets = np.cumsum([0, num_residents, S1_school.total_people(),
+                         S2_school.total_people()])
+
+    settled = np.zeros(len(immune), dtype=bool)
+    for day in range (num_sim_days):
+        
+        #(schools update days sick at the start of step)
+        
+        #assign new cases of sickness (i.e., originating outside 
+        #the town), today_cases for each sim
+        today_cases = daily_cases[:, day]
+        
+        if today_cases.any():
+            #print ("Cases today: {}".format(today_cases))
+
+            sims, new_cases = sample_non_immune(immune, today_cases, rng)
+
+            group = np.searchsorted(offsets, new_cases, side="right") - 1
+            x = new_cases - offsets[group]
+
+            # cases among other residents never reach the schools,
+            # so only the handful that land in the schools matter
+            in_school = group > 0
+            for b, g, i in zip(sims[in_school], group[in_school],
+                               x[in_school]):
+                already_sick = not schools[g].sicken_xth_person(b, i, day)
+    
+        
+        #spread virus from existing cases in schools,
+        #within classrooms only on weekdays,
+        #and test for virus - only on certain days
+        weekday = is_weekday[day]
+        test_day = is_test_day[day]
+        S1_school.step(day, weekday, test_day, settled)
+        S2_school.step(day, weekday, False, settled) # No testing at S2_school
+
+        settled = sims_settled(S1_school, S2_school, day)
+        if settled.all():
+            break
+
+
+def sims_settled(S1_school, S2_school, day):
+    # Which sims' final results can't change after today.
+    # They only look at the two siblings (person 0 of each 
+    # school) and the tests in the S1 sibling's classroom.
+    # A sibling is settled once infected, or once infections 
+    # are too late to count (after N_days); the tests are 
+    # settled once one is positive (that day never changes), 
+    # or if neither sibling counts as infected.
+    # Mostly this stops the last few days after N_days, when
+    # the great majority of sims are already settled
+    S1_day = S1_school.arrays.day_infected[:, 0]
+    S2_day = S2_school.arrays.day_infected[:, 0]
+    past_N_days = day >= N_days
+    return (((S1_day <= day) | past_N_days) &
+            ((S2_day <= day) | past_N_days) &
+            ((S1_school.earliest_positive_test_day[:, 0] <
+              no_positive_test) |
+             ((S1_day > N_days) & (S2_day > N_days))))
+
+
+def gpu_available():
+    return use_gpu and (torch is not None) and torch.cuda.is_available()
+
+
+def step_gpu(days_with_virus, day_infected, family_slot, classroom_id,
+             is_student, preexisting_immunity, earliest_positive_test_day,
+             num_families, day, weekday, test_day, generator):
+    # Same as step(), but for torch tensors on the GPU, 
+    # written as whole-batch tensor operations.
+    # family_slot is family_id with teachers moved to an
+    # extra family num_families (scatter can't take -1).
+    num_sims, num_people = days_with_virus.shape
+    num_classrooms = earliest_positive_test_day.shape[1]
+    device = days_with_virus.device
+    classroom_ids = classroom_id.expand(num_sims, -1)
+
+    # who is contagious / would test positive today
+    contagious = ((days_with_virus >= first_contagious_day) &
+                  (days_with_virus < last_contagious_day))
+    positive = ((days_with_virus > first_positive_test_day) &
+                (days_with_virus <= last_positive_test_day))
+    num_contagious = torch.zeros(
+            num_sims, num_classrooms, device=device).scatter_add_(
+            1, classroom_ids, contagious.float())
+    num_positive = torch.zeros(
+            num_sims, num_classrooms, device=device).scatter_add_(
+            1, classroom_ids, positive.float())
+    # (only students spread within families)
+    contagious_families = torch.zeros(
+            num_sims, num_families+1, device=device).scatter_add_(
+            1, family_slot, (contagious & is_student).float()) > 0
+
+    # spread virus within classrooms, only on weekdays
+    # and only if classroom is not offline
+    # (i.e., has positive test results),
+    # and within families every day
+    offline = day - test_lag > earliest_positive_test_day
+    prob_transmission = 1-(1-class_spread_rate)**num_contagious
+    prob_transmission[offline | (num_contagious == 0)] = 0
+    if not weekday:
+        prob_transmission.zero_()
+    sicken = ((torch.rand(num_sims, num_people, device=device,
+                          generator=generator) <
+               prob_transmission.gather(1, classroom_ids)) |
+              (contagious_families.gather(1, family_slot) & is_student))
+    sicken &= (days_with_virus == -1) & ~preexisting_immunity
+    days_with_virus[sicken] = 0
+    day_infected[sicken] = day
+
+    # test for virus
+    # Assumes test does not catch cases every time
+    if test_day:
+        tested = ((num_positive > 0) &
+                  (torch.rand(num_sims, num_classrooms, device=device,
+                              generator=generator) < sensitivity))
+        today = torch.full_like(earliest_positive_test_day,
+                                no_positive_test)
+        today[tested] = day
+        torch.minimum(earliest_positive_test_day, today,
+                      out=earliest_positive_test_day)
+
+    # For sick people, increments days_with_virus
+    days_with_virus += (days_with_virus != -1).short()
+
+
+def run_days_gpu(S1_school, S2_school, immune, daily_cases, rng):
+    # Same as run_days(), on the GPU with torch.
+    # Both schools go into one tensor so each day's new cases
+    # land with a single scatter, and each school works on 
+    # a slice of it.  Arrays are copied to the GPU once
+    # and back once at the end.
+    num_sims = immune.shape[0]
+    num_residents = (population - S1_school.total_people()
+                     - S2_school.total_people())
+    device = torch.device("cuda")
+    generator = torch.Generator(device=device)
+    generator.manual_seed(int(rng.integers(2**63)))
+    schools = [S1_school, S2_school]
+
+    def to_gpu(*arrays):
+        return torch.from_numpy(
+            np.ascontiguousarray(np.concatenate(arrays, axis=1))
+            ).to(device)
+
+    days_with_virus = to_gpu(*[s.arrays.days_with_virus for s in schools])
+    day_infected = to_gpu(*[s.arrays.day_infected for s in schools])
+    # new cases only go to people in immune's non-immune list,
+    # and protected people never catch them
+    not_in_list = torch.from_numpy(immune).to(device)
+    protected = np.zeros((1, days_with_virus.shape[1]), dtype=bool)
+    protected[0, list(S1_school.protected)] = True
+    protected[0, [S1_school.total_people() + x
+                  for x in S2_school.protected]] = True
+    protected = torch.from_numpy(protected).to(device)
+    immune = to_gpu(*[s.arrays.preexisting_immunity for s in schools])
+    sims = torch.arange(num_sims, device=device)[:, None]
+    daily_cases = torch.from_numpy(daily_cases).to(device)
+
+    slices = []
+    start = 0
+    for s in schools:
+        arr = s.arrays
+        family_slot = np.where(arr.is_student, arr.family_id, s.num_families)
+        slices.append((slice(start, start+s.total_people()),
+                       torch.from_numpy(family_slot.astype(np.int64)
+                                        ).to(device),
+                       torch.from_numpy(arr.classroom_id.astype(np.int64)
+                                        ).to(device),
+                       torch.from_numpy(arr.is_student).to(device),
+                       torch.from_numpy(s.earliest_positive_test_day
+                                        ).to(device)))
+        start += s.total_people()
+
+    for day in range (num_sim_days):
+        
+        #(schools advance their days sick at the end of step_gpu)
+
+        #assign new cases of sickness (i.e., originating outside 
+        #the town), today_cases for each sim
+        today_cases = daily_cases[:, day]
+        max_cases = int(today_cases.max())
+        if max_cases > 0:
+            # as in sample_non_immune
+            new_cases = torch.randint(
+                    0, population, (num_sims, max_cases), device=device,
+                    generator=generator)
+            while True:
+                redraw = not_in_list[sims, new_cases]
+                sorted_cases = new_cases.sort(dim=1).values
+                redraw[(sorted_cases[:, 1:] == sorted_cases[:, :-1]
+                        ).any(dim=1)] = True
+                num_redraws = int(redraw.sum())
+                if num_redraws == 0:
+                    break
+                new_cases[redraw] = torch.randint(
+                    0, population, (num_redraws,), device=device,
+                    generator=generator)
+            # cases among other residents never reach the schools, 
+            # so they (and unused picks) go to a spare last column
+            x = new_cases - num_residents
+            x[(x < 0) |
+              (torch.arange(max_cases, device=device) >= 
+               today_cases[:, None])] = immune.shape[1]
+            is_case = torch.zeros(
+                    num_sims, immune.shape[1]+1, dtype=torch.int8,
+                    device=device).scatter_add_(
+                    1, x, torch.ones_like(x, dtype=torch.int8)
+                    )[:, :-1] > 0
+            sicken = (is_case & (days_with_virus == -1) &
+                      ~immune & ~protected)
+            days_with_virus[sicken] = 0
+            day_infected[sicken] = day
+
+        #spread virus from existing cases in schools,
+        #within classrooms only on weekdays,
+        #and test for virus - only on certain days
+        weekday = is_weekday[day]
+        test_day = is_test_day[day]
+        for s, (people, family_slot, classroom_id, is_student,
+                earliest) in zip(schools, slices):
+            step_gpu(days_with_virus[:, people], day_infected[:, people],
+                     family_slot, classroom_id, is_student, 
+                     immune[:, people], earliest, s.num_families,
+                     day, weekday,
+                     test_day and (s is S1_school), # No testing at S2
+                     generator)
+
+    for s, (people, _, _, _, earliest) in zip(schools, slices):
+        s.arrays.days_with_virus[:] = days_with_virus[:, people].cpu().numpy()
+        s.arrays.day_infected[:] = day_infected[:, people].cpu().numpy()
+        s.earliest_positive_test_day[:] = earliest.cpu().numpy()
+
+
+def run_batch(job):
+    # Runs a batch of simulations side by side and returns 
+    # their total counts, in the order of the results printed 
+    # at the end.  job is (seed, num_sims).
+    # Each batch seeds its own random numbers, so batches can 
+    # run in separate processes.
+    seed, num_sims = job
+    rng = np.random.default_rng(seed)
+
+    S1_infections = 0
+    S2_infections = 0
+    S1_infections_no_warning = 0
+    S1_infections_some_warning = 0 # in time to save 2nd degree of separation
+    S1_infections_good_warning = 0 # in time to save 1st degree of separation
+
+    Agg_infections = 0
+    Agg_infections_no_warning = 0
+    Agg_infections_some_warning = 0
+    Agg_infections_good_warning = 0
+
     #init people
 
-    S1_school = school("S1_school", S1_classes_in_school,
-                      S1_class_size, [5]*S1_class_size, S1_teachers)
+    S1_school = school("S1_school", S1_layout, num_sims, rng)
 
-    S2_school = school("S2_school", S2_classes_in_school,
-                      S2_class_size, [3]*S2_class_size, S2_teachers)
+    S2_school = school("S2_school", S2_layout, num_sims, rng)
     
-    other_residents = [
-        person("resident" + str(i), 30)
-        for i in range(population
-                       -S1_school.total_people()
-                       -S2_school.total_people())] 
+    # other residents only matter as people new cases 
+    # can land on, so they are just numbers
+    S1_total = S1_school.total_people()
+    S2_total = S2_school.total_people()
+    num_residents = population - S1_total - S2_total
 
-    # assign pre-existing immunity, 
+    # assign pre-existing immunity (different people in each sim), 
     # but exclude our two siblings of interest
-
-    pop = list(range(population)) 
-     
-    immune_list = random.sample(pop, actual_historic_cases) 
-    for i in immune_list:
-        if i < len(other_residents):
-            other_residents[i].give_preexisting_immunity()
-        elif i < len(other_residents) + S1_school.total_people(): 
-            S1_school.preexisting_immunity_to_xth_person(
-                i-len(other_residents), ["student_1_1"])
-        else: 
-            S2_school.preexisting_immunity_to_xth_person(
-                i-len(other_residents)-S1_school.total_people(),
-                ["student_1_1"])
-
-    non_immune_list = list(set(pop) - set(immune_list))
+    # everyone is numbered residents first, then S1, then S2
+
+    S1_school.protect(["student_1_1"])
+    S2_school.protect(["student_1_1"])
+
+    immune = np.zeros((num_sims, population), dtype=bool)
+    choice = rng.choice # (looked up once, not once per sim)
+    for b in range(num_sims):
+        immune[b, choice(population, actual_historic_cases,
+                         replace=False)] = True
+    S1_school.give_preexisting_immunity(
+        immune[:, num_residents:num_residents+S1_total])
+    S2_school.give_preexisting_immunity(
+        immune[:, num_residents+S1_total:])
     
     # assign students to families
     S1_school.assign_to_random_families()
@@ -530,159 +862,119 @@ for sim in range(N_sim):
     # but put our two siblings of interest in their own family.
     # Or separate families if we want to tease apart 
     # the influence of either school
-    S1_school.classrooms[0].students[0].assign_to_family(-1)
-    S2_school.classrooms[0].students[0].assign_to_family(-2)
-    
-    for day in range (N_days+2*first_contagious_day):
-        
-        #update days sick
-        for resident in other_residents:
-            resident.update_days_sick()
-        
-        S1_school.update_days_sick()
-        S2_school.update_days_sick()
-        
-        #assign new cases of sickness (i.e., originating outside 
-        #the town)
-        if random.uniform(0, 1) < fraction_part:
-            today_cases = math.ceil(new_cases_per_day)
-        else:
-            today_cases = math.floor(new_cases_per_day)
-        
-        if today_cases > 0:
-            #print ("Cases today: {}".format(today_cases))
-
-            new_cases_list = random.sample(non_immune_list, today_cases) 
-            for i in new_cases_list:
-                if i < len(other_residents):
-                    other_residents[i].sicken(day)
-                elif i < len(other_residents) + S1_school.total_people(): 
-                    already_sick = not S1_school.sicken_xth_person(
-                            i-len(other_residents), ["student_1_1"], day)
-
-                else: 
-                    already_sick = not S2_school.sicken_xth_person(
-                            i-len(other_residents)-S1_school.total_people(),
-                            ["student_1_1"], day)
+    S1_school.assign_to_own_family(0)
+    S2_school.assign_to_own_family(0)
     
+    # new cases of sickness from outside the town, for every
+    # sim and day, drawn all at once: new_cases_per_day rounded 
+    # up (with chance fraction_part) or down
+    # (int16 - a handful of cases a day at most)
+    daily_cases = (math.floor(new_cases_per_day) + (
+        rng.random((num_sims, num_sim_days)) <
+        fraction_part)).astype(np.int16)
+
+    if gpu_available():
+        run_days_gpu(S1_school, S2_school, immune, daily_cases, rng)
+    else:
+        run_days(S1_school, S2_school, immune, daily_cases, rng)
+
+    #Final results for each simulation, looking only at
+    #our two siblings (person 0 of each school) and the
+    #tests in the S1 sibling's classroom
+    S1_days_infected = S1_school.arrays.day_infected[:, 0]
+    S2_days_infected = S2_school.arrays.day_infected[:, 0]
+    S1_earliest_days = S1_school.earliest_positive_test_day[:, 0]
+    for b in range(num_sims):
+        s1d = S1_days_infected[b]
+        s2d = S2_days_infected[b]
+        s1e = S1_earliest_days[b]
+        S1_infected = s1d <= N_days
+        S2_infected = s2d <= N_days
+
+        if S1_infected:
+            S1_infections += 1 
+            (S1_infections_no_warning,
+                S1_infections_some_warning,
+                S1_infections_good_warning) =\
+            determine_agg_warnings(
+                s1e,
+                s1d + first_contagious_day,
+                S1_infections_no_warning,
+                S1_infections_some_warning,
+                S1_infections_good_warning)
         
-        #spread virus from existing cases in schools
-        S1_school.spread_virus(day)
-        S2_school.spread_virus(day)
-        
-        #test for virus - only on certain days
-        #if True:
-        if (day % 7 in [0, 2]):
-            S1_school.test(day)
-            #S2_school.test(day) # No testing at S2_school
-        
-
-    #Final results for simulation
-    if S1_school.classrooms[0].students[0].day_infected <=\
-        N_days:
-            
-        S1_infections += 1 
-        
-        day_contagious =\
-            S1_school.classrooms[0].students[0].day_infected +\
-            first_contagious_day
-        
-        if S1_school.classrooms[0].earliest_positive_test_day\
-        is None:
-            S1_infections_no_warning += 1
-
-        elif S1_school.classrooms[0].earliest_positive_test_day\
-        + test_lag >= day_contagious + first_contagious_day:
-            S1_infections_no_warning += 1
-            
-        elif S1_school.classrooms[0].earliest_positive_test_day\
-        + test_lag >= day_contagious:
-            S1_infections_some_warning += 1
-
-        else: 
-            S1_infections_good_warning += 1 
-        
-    if S2_school.classrooms[0].students[0].day_infected <=\
-        N_days:
-            
-        S2_infections += 1        
-
-    if ((S1_school.classrooms[0].students[0].day_infected <=\
-        N_days) or
-        (S2_school.classrooms[0].students[0].day_infected <=\
-        N_days)):
-        Agg_infections += 1 
-
-    # Aggregate warnings must account for joint occurrences
-    # at both schools.  E.g.,  there might be an infection 
-    # at school 2, and we luck out with a 
-    # timely (unrelated) warning at school 1
-
-    if ((S1_school.classrooms[0].students[0].day_infected <=\
-         N_days) and
-        (S2_school.classrooms[0].students[0].day_infected <=\
-         N_days)   
-        ):
-        day_contagious = min(\
-            S1_school.classrooms[0].students[0].day_infected +\
-            first_contagious_day, 
-            S2_school.classrooms[0].students[0].day_infected +\
-            first_contagious_day) 
-          
-        (Agg_infections_no_warning,
-            Agg_infections_some_warning,
-            Agg_infections_good_warning) =\
-        determine_agg_warnings(
-            S1_school.classrooms[0].earliest_positive_test_day,
-            day_contagious,
-            Agg_infections_no_warning,
-            Agg_infections_some_warning,
-            Agg_infections_good_warning)
- 
-    elif (S1_school.classrooms[0].students[0].day_infected <=\
-         N_days):
-        day_contagious =\
-            S1_school.classrooms[0].students[0].day_infected +\
-            first_contagious_day 
-          
-        (Agg_infections_no_warning,
-            Agg_infections_some_warning,
-            Agg_infections_good_warning) =\
-        determine_agg_warnings(
-            S1_school.classrooms[0].earliest_positive_test_day,
-            day_contagious,
+        if S2_infected:
+            S2_infections += 1        
+
+        # Aggregate warnings must account for joint occurrences
+        # at both schools.  E.g.,  there might be an infection 
+        # at school 2, and we luck out with a 
+        # timely (unrelated) warning at school 1
+        # (a sibling who isn't infected was infected, if ever,
+        # after N_days, so the min is the first infected sibling)
+
+        if S1_infected or S2_infected:
+            Agg_infections += 1 
+            (Agg_infections_no_warning,
+                Agg_infections_some_warning,
+                Agg_infections_good_warning) =\
+            determine_agg_warnings(
+                s1e,
+                min(s1d, s2d) + first_contagious_day,
+                Agg_infections_no_warning,
+                Agg_infections_some_warning,
+                Agg_infections_good_warning)
+
+
+    return (S1_infections,
+            S1_infections_no_warning,
+            S1_infections_some_warning,
+            S1_infections_good_warning,
+            S2_infections,
+            Agg_infections,
             Agg_infections_no_warning,
             Agg_infections_some_warning,
             Agg_infections_good_warning)
 
-    elif (S2_school.classrooms[0].students[0].day_infected <=\
-         N_days):
-        day_contagious =\
-            S2_school.classrooms[0].students[0].day_infected +\
-            first_contagious_day 
-          
-        (Agg_infections_no_warning,
-            Agg_infections_some_warning,
-            Agg_infections_good_warning) =\
-        determine_agg_warnings(
-            S1_school.classrooms[0].earliest_positive_test_day,
-            day_contagious,
-            Agg_infections_no_warning,
-            Agg_infections_some_warning,
-            Agg_infections_good_warning)
 
-
-    #print ("resident_cases: {}".format(resident_cases(other_residents)))
-    
-print ("Infection rate (S1): {}".format(S1_infections/N_sim))
-print ("Inf rate, no warning (S1): {}".format(S1_infections_no_warning/N_sim))
-print ("Inf rate, some warning (S1): {}".format(S1_infections_some_warning/N_sim))
-print ("Inf rate, good warning (S1): {}".format(S1_infections_good_warning/N_sim))
-print ("\n")
-print ("Infection rate (S2): {}".format(S2_infections/N_sim)) 
-print ("\n")
-print ("AGGREGATE RESULTS:")
-print ("Infection rate (any): {}".format(Agg_infections/N_sim))
-print ("Inf rate, no warning: {}".format(Agg_infections_no_warning/N_sim))
-print ("Inf rate, some warning: {}".format(Agg_infections_some_warning/N_sim))
-print ("Inf rate, good warning: {}".format(Agg_infections_good_warning/N_sim))
+if __name__ == "__main__":
+    if gpu_available():
+        # the GPU runs every sim at once
+        totals = run_batch((np.random.SeedSequence(), N_sim))
+    else:
+        # sims are independent, so run them in batches across 
+        # all cores and add up their counts as they finish
+        ncpu = os.cpu_count()
+        num_batches = max(math.ceil(N_sim/batch_size), min(ncpu, N_sim))
+        batch_sizes = [N_sim//num_batches + (i < N_sim % num_batches)
+                       for i in range(num_batches)]
+        seeds = np.random.SeedSequence().spawn(num_batches)
+        totals = np.zeros(9, dtype=int)
+        with Pool(ncpu) as pool:
+            for batch, counts in enumerate(pool.imap_unordered(
+                    run_batch, zip(seeds, batch_sizes))):
+                print ("Batch: {} of {}".format(batch+1, num_batches))
+                totals += counts
+
+    (S1_infections,
+     S1_infections_no_warning,
+     S1_infections_some_warning,
+     S1_infections_good_warning,
+     S2_infections,
+     Agg_infections,
+     Agg_infections_no_warning,
+     Agg_infections_some_warning,
+     Agg_infections_good_warning) = totals
+
+    print ("Infection rate (S1): {}".format(S1_infections/N_sim))
+    print ("Inf rate, no warning (S1): {}".format(S1_infections_no_warning/N_sim))
+    print ("Inf rate, some warning (S1): {}".format(S1_infections_some_warning/N_sim))
+    print ("Inf rate, good warning (S1): {}".format(S1_infections_good_warning/N_sim))
+    print ("\n")
+    print ("Infection rate (S2): {}".format(S2_infections/N_sim)) 
+    print ("\n")
+    print ("AGGREGATE RESULTS:")
+    print ("Infection rate (any): {}".format(Agg_infections/N_sim))
+    print ("Inf rate, no warning: {}".format(Agg_infections_no_warning/N_sim))
+    print ("Inf rate, some warning: {}".format(Agg_infections_some_warning/N_sim))
+    print ("Inf rate, good warning: {}".format(Agg_infections_good_warning/N_sim))